@@ -0,0 +1,46 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""Compiled twin of app.classify_prices: one fused pass instead of several NumPy temporaries"""
+import numpy as np
+
+
+def classify_prices(const double[::1] prices):
+    cdef Py_ssize_t i, n = prices.shape[0]
+    cdef double p, total = 0.0
+    cdef double min_price, max_price, avg_price, percent_diff
+
+    # Bounds checks are off, so reading prices[0] of an empty buffer would be undefined
+    if n == 0:
+        raise ValueError("classify_prices() needs at least one price")
+    min_price = prices[0]
+    max_price = prices[0]
+
+    for i in range(n):
+        p = prices[i]
+        total += p
+        if p < min_price:
+            min_price = p
+        if p > max_price:
+            max_price = p
+    avg_price = total / n
+
+    price_diffs = np.empty(n, dtype=np.float64)
+    percent_diffs = np.empty(n, dtype=np.float64)
+    buckets = np.empty(n, dtype=np.int64)
+    cdef double[::1] diff_view = price_diffs
+    cdef double[::1] percent_view = percent_diffs
+    cdef long long[::1] bucket_view = buckets
+
+    for i in range(n):
+        diff_view[i] = prices[i] - avg_price
+        percent_diff = diff_view[i] / avg_price * 100.0
+        percent_view[i] = percent_diff
+        if percent_diff <= -15:
+            bucket_view[i] = 0
+        elif percent_diff <= -5:
+            bucket_view[i] = 1
+        elif percent_diff <= 5:
+            bucket_view[i] = 2
+        else:
+            bucket_view[i] = 3
+
+    return avg_price, min_price, max_price, price_diffs, percent_diffs, buckets
@@ -1,19 +1,139 @@
+import asyncio
+import aiohttp
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+import lxml.html
+from lxml import etree
+import charset_normalizer
 import re
+import sys
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple, Union
 import json
-import random
+import orjson
+import operator
+import numpy as np
+
+
+# XPath 1.0 has no case-insensitive match, so class names are lowercased with translate()
+_LOWER_CLASS = "translate(@class, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')"
+
+# Compiled once; each call runs entirely inside libxml2
+_PRODUCT_DIV_XPATH = etree.XPath(f"//div[contains({_LOWER_CLASS}, 'product') or contains({_LOWER_CLASS}, 'item')]")
+_ARTICLE_XPATH = etree.XPath("//article")
+_PRODUCT_LI_XPATH = etree.XPath(f"//li[contains({_LOWER_CLASS}, 'product') or contains({_LOWER_CLASS}, 'item')]")
+_NAME_HEADING_XPATH = etree.XPath("(.//h2 | .//h3 | .//h4)[1]")
+_NAME_LINK_XPATH = etree.XPath(f"(.//a[contains({_LOWER_CLASS}, 'title') or contains({_LOWER_CLASS}, 'name')])[1]")
+_PRICE_XPATH = etree.XPath(f"(.//*[contains({_LOWER_CLASS}, 'price')])[1]")
+_TEXT_XPATH = etree.XPath("string(.)")
+_PRICE_NUM_RE = re.compile(r'[\d,]+\.?\d*')
+
+# Raw page bodies kept per ScraperAgent, so repeat scrapes of a URL skip the network
+_PAGE_CACHE_SIZE = 256
+
+# Only the top of a page is read; product lists sit early and parsing stops at 10 containers
+_MAX_PAGE_BYTES = 512 * 1024
+
+# A <meta charset> / http-equiv declaration near the top is honoured by libxml2 itself
+_META_CHARSET_RE = re.compile(rb'<meta[^>]*charset', re.I)
+_META_CHARSET_WINDOW = 64 * 1024
+
+# Unicode input must not carry an XML encoding declaration, lxml rejects it
+_XML_DECL_RE = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+
+def _sniff_encoding(body: bytes) -> str:
+    """Guess the encoding of a page that declares none, as a Python codec name"""
+    match = charset_normalizer.from_bytes(body).best()
+    return match.encoding if match else 'utf-8'
+
+
+# lxml parsers must not be shared across threads, and pages are parsed in worker threads
+_parser_local = threading.local()
+
+
+def _html_parser(encoding: Optional[str] = None) -> lxml.html.HTMLParser:
+    """Per-thread, per-encoding parser that never builds comment, PI or whitespace-only text nodes
+
+    Raises LookupError when libxml2 does not know the encoding label.
+    """
+    parsers = getattr(_parser_local, 'parsers', None)
+    if parsers is None:
+        parsers = _parser_local.parsers = {}
+    parser = parsers.get(encoding)
+    if parser is None:
+        parser = lxml.html.HTMLParser(encoding=encoding, remove_comments=True, remove_pis=True,
+                                      remove_blank_text=True)
+        parsers[encoding] = parser
+    return parser
+
+
+def _parse_html(content: bytes, declared: Optional[str]) -> lxml.html.HtmlElement:
+    """Parse a page with the server's charset, else its own <meta>, else a sniffed encoding"""
+    if declared:
+        # Server labels such as 'EUC-JP' go to libxml2 untouched
+        try:
+            return lxml.html.fromstring(content, parser=_html_parser(declared))
+        except LookupError:
+            encoding = declared
+    elif _META_CHARSET_RE.search(content, 0, _META_CHARSET_WINDOW):
+        return lxml.html.fromstring(content, parser=_html_parser())
+    else:
+        encoding = _sniff_encoding(content)
+
+    # libxml2 doesn't know this label (sniffed results are Python codec names), so decode here
+    try:
+        text = content.decode(encoding, 'replace')
+    except LookupError:
+        print(f"[AGENT 1] Unknown charset {encoding!r}, letting the parser detect the encoding")
+        return lxml.html.fromstring(content, parser=_html_parser())
+    return lxml.html.fromstring(_XML_DECL_RE.sub('', text, count=1), parser=_html_parser())
+
+
+# Deal buckets indexed by classify_prices() output: (quality, is_good_deal)
+_DEAL_BUCKETS = [
+    ("EXCELLENT", True),
+    ("GOOD", True),
+    ("AVERAGE", False),
+    ("POOR", False),
+]
+
+_BY_PRICE = operator.attrgetter('product.price')
+
+# Above this many listings generate_report skips the full sort and only finds the best deal
+_EAGER_SORT_LIMIT = 64
+
+_DEAL_EMOJI = {
+    "EXCELLENT": "🔥",
+    "GOOD": "✅",
+    "AVERAGE": "⚠️",
+    "POOR": "❌"
+}
+
+_REASONING_TEMPLATES = {
+    "EXCELLENT": "Price is {:.1f}% below average - exceptional deal!",
+    "GOOD": "Price is {:.1f}% below average - good value.",
+    "AVERAGE": "Price is close to market average ({:.1f}%).",
+    "POOR": "Price is {:.1f}% above average - not recommended.",
+}
 
 
 class ProductData:
-    def __init__(self, store, product_name, price, url):
+    __slots__ = ('store', 'product_name', 'price', 'url', 'scraped_at', 'scraped_at_iso', 'additional_info')
+
+    def __init__(self, store, product_name, price, url, scraped_at=None, scraped_at_iso=None):
         self.store = store
         self.product_name = product_name
         self.price = price
         self.url = url
-        self.scraped_at = datetime.now()
+        # Batches pass one shared timestamp instead of calling datetime.now() per product
+        self.scraped_at = scraped_at if scraped_at is not None else datetime.now()
+        self.scraped_at_iso = scraped_at_iso
         self.additional_info = {}
 
     def to_dict(self):
@@ -22,128 +142,321 @@ class ProductData:
             'product_name': self.product_name,
             'price': self.price,
             'url': self.url,
-            'scraped_at': self.scraped_at.isoformat()
+            'scraped_at': self.scraped_at_iso or self.scraped_at.isoformat()
         }
 
 
 class DealAnalysis:
-    def __init__(self, product, is_good_deal, reasoning, avg_price, price_diff, deal_quality):
+    __slots__ = ('product', 'is_good_deal', 'average_price', 'price_difference', 'percent_difference',
+                 'deal_quality')
+
+    def __init__(self, product, is_good_deal, avg_price, price_diff, percent_diff, deal_quality):
         self.product = product
         self.is_good_deal = is_good_deal
-        self.reasoning = reasoning
         self.average_price = avg_price
         self.price_difference = price_diff
+        self.percent_difference = percent_diff
         self.deal_quality = deal_quality
 
+    @property
+    def reasoning(self):
+        # Formatted on access; bulk runs that never display a report skip it entirely
+        percent = abs(self.percent_difference) if self.is_good_deal else self.percent_difference
+        return _REASONING_TEMPLATES[self.deal_quality].format(percent)
+
+    def to_dict(self):
+        return {
+            'product': self.product.to_dict(),
+            'is_good_deal': self.is_good_deal,
+            'average_price': self.average_price,
+            'price_difference': self.price_difference,
+            'percent_difference': self.percent_difference,
+            'deal_quality': self.deal_quality,
+            'reasoning': self.reasoning
+        }
+
 
 class Report:
+    __slots__ = ('analyses', 'generated_at', 'summary')
+
     def __init__(self, analyses, summary):
         self.analyses = analyses
         self.generated_at = datetime.now()
         self.summary = summary
 
+    def to_json_bytes(self) -> bytes:
+        return orjson.dumps({
+            'generated_at': self.generated_at,
+            'summary': self.summary,
+            'analyses': [a.to_dict() for a in self.analyses]
+        }, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def price_array(products: List[ProductData]) -> np.ndarray:
+    """Copy product prices into a contiguous array parallel to the product list"""
+    return np.fromiter((p.price for p in products), dtype=np.float64, count=len(products))
+
+
+def classify_prices(prices: np.ndarray) -> Tuple[float, float, float, np.ndarray, np.ndarray, np.ndarray]:
+    """Return (avg, min, max, price_diffs, percent_diffs, buckets) for a non-empty price array"""
+    if prices.shape[0] == 0:
+        raise ValueError("classify_prices() needs at least one price")
+    avg_price = float(prices.mean())
+    price_diffs = prices - avg_price
+    percent_diffs = price_diffs / avg_price * 100.0
+    buckets = np.select(
+        [percent_diffs <= -15, percent_diffs <= -5, percent_diffs <= 5],
+        [0, 1, 2],
+        default=3
+    )
+    return avg_price, float(prices.min()), float(prices.max()), price_diffs, percent_diffs, buckets
+
+
+# Prefer the Cython build of classify_prices (python build_kernel.py) when present
+try:
+    from _deal_kernel import classify_prices
+except ImportError:
+    pass
+
+
+# Connection pool size and retry policy shared by the requests and aiohttp fetch paths
+_POOL_SIZE = 32
+_MAX_RETRIES = 3
+_RETRY_BACKOFF = 0.3
+_RETRY_STATUSES = (502, 503, 504)
+
 
 # Agent 1: Web Scraping Agent
 class ScraperAgent:
-    def __init__(self):
+    def __init__(self, page_cache_ttl: float = 300.0):
+        self.page_cache_ttl = page_cache_ttl
+        self._page_cache: "OrderedDict[str, Tuple[float, bytes, Optional[str]]]" = OrderedDict()
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            # Only advertises encodings urllib3 can actually decode here
+            'Accept-Encoding': ACCEPT_ENCODING
         })
-
-    def scrape_multiple_stores(self, urls: List[str], product_query: str) -> List[ProductData]:
+        adapter = HTTPAdapter(
+            pool_connections=_POOL_SIZE,
+            pool_maxsize=_POOL_SIZE,
+            max_retries=Retry(total=_MAX_RETRIES, backoff_factor=_RETRY_BACKOFF,
+                              status_forcelist=list(_RETRY_STATUSES))
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def scrape_multiple_stores(self, urls: List[str], product_query: str, with_prices: bool = False
+                               ) -> Union[List[ProductData], Tuple[List[ProductData], np.ndarray]]:
+        return asyncio.run(self.scrape_multiple_stores_async(urls, product_query, with_prices))
+
+    async def scrape_multiple_stores_async(self, urls: List[str], product_query: str, with_prices: bool = False
+                                           ) -> Union[List[ProductData], Tuple[List[ProductData], np.ndarray]]:
         print(f"\n[AGENT 1 - SCRAPER] Starting data collection for: {product_query}")
         all_products = []
-
-        for url in urls:
-            try:
+        now = datetime.now()
+        now_iso = now.isoformat()
+
+        connector = aiohttp.TCPConnector(limit=_POOL_SIZE)
+        timeout = aiohttp.ClientTimeout(total=10)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers={'User-Agent': self.session.headers['User-Agent']}) as session:
+            for url in urls:
                 print(f"[AGENT 1] Scraping: {url}")
-                products = self.scrape_store(url, product_query)
-                all_products.extend(products)
-                print(f"[AGENT 1] Found {len(products)} products from {url}")
-            except Exception as e:
-                print(f"[AGENT 1] Error scraping {url}: {str(e)}")
+            tasks = [self._fetch(session, url) for url in urls]
+            bodies = await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Parse off the event loop so one large page doesn't stall the rest
+        parsed = await asyncio.gather(
+            *(self._parse_fetched(body, url, now, now_iso) for url, body in zip(urls, bodies)),
+            return_exceptions=True
+        )
+
+        # Prices arrive alongside each page's products, so the array never walks the objects
+        all_prices = []
+        for url, page in zip(urls, parsed):
+            if isinstance(page, Exception):
+                print(f"[AGENT 1] Error scraping {url}: {str(page)}")
+                continue
+            products, prices = page
+            all_products.extend(products)
+            all_prices.extend(prices)
+            print(f"[AGENT 1] Found {len(products)} products from {url}")
 
         print(f"[AGENT 1] ✓ Completed! Total products found: {len(all_products)}")
+        if with_prices:
+            return all_products, np.array(all_prices, dtype=np.float64)
         return all_products
 
+    def _cached_page(self, url: str) -> Optional[Tuple[bytes, Optional[str]]]:
+        entry = self._page_cache.get(url)
+        if entry is None:
+            return None
+        fetched_at, body, encoding = entry
+        if time.monotonic() - fetched_at > self.page_cache_ttl:
+            del self._page_cache[url]
+            return None
+        self._page_cache.move_to_end(url)
+        return body, encoding
+
+    def _store_page(self, url: str, body: bytes, encoding: Optional[str]):
+        self._page_cache[url] = (time.monotonic(), body, encoding)
+        self._page_cache.move_to_end(url)
+        if len(self._page_cache) > _PAGE_CACHE_SIZE:
+            self._page_cache.popitem(last=False)
+
+    async def _fetch(self, session: aiohttp.ClientSession, url: str) -> Tuple[bytes, Optional[str]]:
+        page = self._cached_page(url)
+        if page is not None:
+            return page
+        # Same bounded retry with exponential backoff as the requests adapter's Retry
+        for attempt in range(_MAX_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(_RETRY_BACKOFF * 2 ** (attempt - 1))
+            try:
+                async with session.get(url) as response:
+                    if response.status in _RETRY_STATUSES and attempt < _MAX_RETRIES:
+                        continue
+                    response.raise_for_status()
+                    chunks = bytearray()
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        chunks += chunk
+                        if len(chunks) >= _MAX_PAGE_BYTES:
+                            break
+                    body = bytes(chunks[:_MAX_PAGE_BYTES])
+                    # Only the declared charset here; sniffing is left to parse_store, off the event loop
+                    encoding = response.charset
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == _MAX_RETRIES:
+                    raise
+                continue
+            self._store_page(url, body, encoding)
+            return body, encoding
+
+    async def _parse_fetched(self, page, url: str, scraped_at: datetime, scraped_at_iso: str
+                             ) -> Tuple[List[ProductData], List[float]]:
+        if isinstance(page, Exception):
+            raise page
+        body, encoding = page
+        return await asyncio.to_thread(self._parse_page, body, url, scraped_at, scraped_at_iso, encoding)
+
     def scrape_store(self, url: str, product_query: str) -> List[ProductData]:
         products = []
         
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            # Generic scraping - customize per store
-            store_name = url.split('/')[2].replace('www.', '')
-            
-            # Try common product container patterns
-            product_containers = (
-                soup.find_all('div', class_=re.compile(r'product|item', re.I)) or
-                soup.find_all('article') or
-                soup.find_all('li', class_=re.compile(r'product|item', re.I))
-            )
-
-            for container in product_containers[:10]:  # Limit to first 10
-                product = self.extract_product_info(container, store_name, url)
-                if product:
-                    products.append(product)
-
+            page = self._cached_page(url)
+            if page is None:
+                with self.session.get(url, timeout=10, stream=True) as response:
+                    response.raise_for_status()
+                    body = response.raw.read(_MAX_PAGE_BYTES, decode_content=True)
+                    # requests fills in ISO-8859-1 for any text/* response, so only trust an explicit charset
+                    declared = response.encoding if 'charset' in response.headers.get('Content-Type', '').lower() else None
+                page = (body, declared)
+                self._store_page(url, *page)
+            body, encoding = page
+            products = self.parse_store(body, url, encoding=encoding)
         except Exception as e:
             print(f"[AGENT 1] Scraping error: {str(e)}")
 
         return products
 
-    def extract_product_info(self, container, store_name: str, source_url: str) -> ProductData:
+    def parse_store(self, content: bytes, url: str, scraped_at: Optional[datetime] = None,
+                    scraped_at_iso: Optional[str] = None, encoding: Optional[str] = None) -> List[ProductData]:
+        return self._parse_page(content, url, scraped_at, scraped_at_iso, encoding)[0]
+
+    def _parse_page(self, content: bytes, url: str, scraped_at: Optional[datetime] = None,
+                    scraped_at_iso: Optional[str] = None, encoding: Optional[str] = None
+                    ) -> Tuple[List[ProductData], List[float]]:
+        products = []
+        prices = []
+        if scraped_at is None:
+            scraped_at = datetime.now()
+            scraped_at_iso = scraped_at.isoformat()
+
+        # lxml refuses an empty document; an empty page simply has no products
+        if not content or content.isspace():
+            return products, prices
+
+        tree = _parse_html(content, encoding)
+
+        # Generic scraping - customize per store
+        store_name = url.split('/')[2].replace('www.', '')
+        
+        # Try common product container patterns
+        product_containers = (
+            _PRODUCT_DIV_XPATH(tree) or
+            _ARTICLE_XPATH(tree) or
+            _PRODUCT_LI_XPATH(tree)
+        )
+
+        for container in product_containers[:10]:  # Limit to first 10
+            product = self.extract_product_info(container, store_name, url, scraped_at, scraped_at_iso)
+            if product:
+                products.append(product)
+                prices.append(product.price)
+
+        return products, prices
+
+    def extract_product_info(self, container, store_name: str, source_url: str,
+                             scraped_at: Optional[datetime] = None,
+                             scraped_at_iso: Optional[str] = None) -> ProductData:
         try:
             # Try to find product name
-            name_elem = (
-                container.find(['h3', 'h4', 'h2']) or
-                container.find('a', class_=re.compile(r'title|name', re.I))
+            name_elems = (
+                _NAME_HEADING_XPATH(container) or
+                _NAME_LINK_XPATH(container)
             )
             
             # Try to find price
-            price_elem = container.find(class_=re.compile(r'price', re.I))
+            price_elems = _PRICE_XPATH(container)
             
-            if name_elem and price_elem:
-                name = name_elem.get_text(strip=True)
-                price_text = price_elem.get_text(strip=True)
+            if name_elems and price_elems:
+                name = _TEXT_XPATH(name_elems[0]).strip()
+                price_text = _TEXT_XPATH(price_elems[0]).strip()
                 
                 # Extract numeric price
-                price_match = re.search(r'[\d,]+\.?\d*', price_text)
+                price_match = _PRICE_NUM_RE.search(price_text)
                 if price_match:
                     price = float(price_match.group().replace(',', ''))
-                    return ProductData(store_name, name, price, source_url)
+                    return ProductData(store_name, name, price, source_url, scraped_at, scraped_at_iso)
         except:
             pass
         
         return None
 
-    def get_mock_data(self, product_name: str) -> List[ProductData]:
+    def get_mock_data(self, product_name: str, with_prices: bool = False
+                      ) -> Union[List[ProductData], Tuple[List[ProductData], np.ndarray]]:
         """Generate mock data for testing without actual websites"""
         print(f"\n[AGENT 1 - SCRAPER] Generating mock data for: {product_name}")
         stores = ["Amazon", "Walmart", "BestBuy", "Target", "eBay"]
         base_price = 299.99
-        products = []
-
-        for store in stores:
-            variance = random.uniform(-50, 50)
-            price = round(base_price + variance, 2)
-            products.append(ProductData(
+        now = datetime.now()
+        now_iso = now.isoformat()
+
+        rng = np.random.default_rng()
+        variances = rng.uniform(-50.0, 50.0, size=len(stores))
+        prices = np.round(base_price + variances, 2)
+        products = [
+            ProductData(
                 store=store,
                 product_name=product_name,
                 price=price,
-                url=f"https://{store.lower()}.com/product"
-            ))
+                url=f"https://{store.lower()}.com/product",
+                scraped_at=now,
+                scraped_at_iso=now_iso
+            )
+            for store, price in zip(stores, prices.tolist())
+        ]
 
         print(f"[AGENT 1] ✓ Generated {len(products)} mock product listings")
+        if with_prices:
+            return products, prices
         return products
 
 
 # Agent 2: Deal Analysis Agent
 class AnalyzerAgent:
-    def analyze_deals(self, products: List[ProductData]) -> List[DealAnalysis]:
+    def analyze_deals(self, products: List[ProductData], prices: Optional[np.ndarray] = None) -> List[DealAnalysis]:
         print(f"\n[AGENT 2 - ANALYZER] Analyzing {len(products)} products for deals...")
         analyses = []
 
@@ -151,41 +464,27 @@ class AnalyzerAgent:
             print("[AGENT 2] No products to analyze")
             return analyses
 
-        prices = [p.price for p in products]
-        avg_price = sum(prices) / len(prices)
-        min_price = min(prices)
-        max_price = max(prices)
+        # Reuse the scraper's price column when given, so the scan never touches the objects
+        if prices is None:
+            prices = price_array(products)
+
+        # Determine deal quality for every product at once
+        avg_price, min_price, max_price, price_diffs, percent_diffs, buckets = classify_prices(
+            np.ascontiguousarray(prices, dtype=np.float64)
+        )
 
         print(f"[AGENT 2] Price Range: ${min_price:.2f} - ${max_price:.2f} | Average: ${avg_price:.2f}")
 
-        for product in products:
-            price_diff = product.price - avg_price
-            percent_diff = (price_diff / avg_price) * 100
-
-            # Determine deal quality
-            if percent_diff <= -15:
-                is_good_deal = True
-                deal_quality = "EXCELLENT"
-                reasoning = f"Price is {abs(percent_diff):.1f}% below average - exceptional deal!"
-            elif percent_diff <= -5:
-                is_good_deal = True
-                deal_quality = "GOOD"
-                reasoning = f"Price is {abs(percent_diff):.1f}% below average - good value."
-            elif percent_diff <= 5:
-                is_good_deal = False
-                deal_quality = "AVERAGE"
-                reasoning = f"Price is close to market average ({percent_diff:.1f}%)."
-            else:
-                is_good_deal = False
-                deal_quality = "POOR"
-                reasoning = f"Price is {percent_diff:.1f}% above average - not recommended."
+        for product, price_diff, percent_diff, bucket in zip(
+                products, price_diffs.tolist(), percent_diffs.tolist(), buckets.tolist()):
+            deal_quality, is_good_deal = _DEAL_BUCKETS[bucket]
 
             analysis = DealAnalysis(
                 product=product,
                 is_good_deal=is_good_deal,
-                reasoning=reasoning,
                 avg_price=avg_price,
                 price_diff=price_diff,
+                percent_diff=percent_diff,
                 deal_quality=deal_quality
             )
             analyses.append(analysis)
@@ -201,12 +500,15 @@ class ReportAgent:
     def generate_report(self, analyses: List[DealAnalysis]) -> Report:
         print(f"\n[AGENT 3 - REPORTER] Compiling comprehensive report...")
 
-        # Sort by price
-        analyses.sort(key=lambda a: a.product.price)
+        # Sort by price; large batches are sorted later, only if the report is displayed or exported
+        if len(analyses) > _EAGER_SORT_LIMIT:
+            best_deal = min(analyses, key=_BY_PRICE)
+        else:
+            analyses.sort(key=_BY_PRICE)
+            best_deal = analyses[0] if analyses else None
 
         # Generate summary
         good_deals = [a for a in analyses if a.is_good_deal]
-        best_deal = analyses[0] if analyses else None
 
         summary = (f"Analyzed {len(analyses)} listings. "
                   f"Found {len(good_deals)} good deals. "
@@ -217,46 +519,58 @@ class ReportAgent:
         return report
 
     def display_report(self, report: Report):
-        print("\n" + "=" * 80)
-        print("                         PRICE COMPARISON REPORT")
-        print("=" * 80)
-        print(f"Generated: {report.generated_at.strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"\nSUMMARY: {report.summary}")
-        print("=" * 80)
-
-        print("\n📊 DETAILED ANALYSIS:\n")
+        report.analyses.sort(key=_BY_PRICE)  # linear when generate_report already sorted
+
+        # Collect every line and emit once, instead of one locked stdout write per print()
+        rule = "=" * 80 + "\n"
+        parts = [
+            "\n", rule,
+            "                         PRICE COMPARISON REPORT\n",
+            rule,
+            f"Generated: {report.generated_at.strftime('%Y-%m-%d %H:%M:%S')}\n",
+            f"\nSUMMARY: {report.summary}\n",
+            rule,
+            "\n📊 DETAILED ANALYSIS:\n\n",
+        ]
 
         for analysis in report.analyses:
-            emoji = {
-                "EXCELLENT": "🔥",
-                "GOOD": "✅",
-                "AVERAGE": "⚠️",
-                "POOR": "❌"
-            }.get(analysis.deal_quality, "⚠️")
-
-            print(f"{emoji} {analysis.product.store:.<15} | ${analysis.product.price:>8.2f} | {analysis.deal_quality:.<10}")
-            print(f"   └─ {analysis.reasoning}")
-            print(f"   └─ URL: {analysis.product.url}")
-            print()
-
-        print("=" * 80)
-        print("\n💡 RECOMMENDATION:")
+            emoji = _DEAL_EMOJI.get(analysis.deal_quality, "⚠️")
+
+            parts.append(f"{emoji} {analysis.product.store:.<15} | ${analysis.product.price:>8.2f} | {analysis.deal_quality:.<10}\n")
+            parts.append(f"   └─ {analysis.reasoning}\n")
+            parts.append(f"   └─ URL: {analysis.product.url}\n")
+            parts.append("\n")
+
         best_deal = report.analyses[0]
         worst_price = report.analyses[-1].product.price
         savings = worst_price - best_deal.product.price
-        print(f"   Buy from {best_deal.product.store} at ${best_deal.product.price:.2f}")
-        print(f"   You'll save ${savings:.2f} compared to the highest price!")
-        print("=" * 80 + "\n")
+        parts += [
+            rule,
+            "\n💡 RECOMMENDATION:\n",
+            f"   Buy from {best_deal.product.store} at ${best_deal.product.price:.2f}\n",
+            f"   You'll save ${savings:.2f} compared to the highest price!\n",
+            rule, "\n",
+        ]
+
+        sys.stdout.write("".join(parts))
+        sys.stdout.flush()
 
     def export_to_file(self, report: Report, filename: str = "price_report.txt"):
-        content = f"PRICE COMPARISON REPORT - {report.generated_at}\n\n{report.summary}\n\n"
-        
-        for analysis in report.analyses:
-            content += f"{analysis.product.store}: ${analysis.product.price:.2f} - {analysis.deal_quality}\n"
-            content += f"{analysis.reasoning}\n\n"
+        report.analyses.sort(key=_BY_PRICE)
+
+        if filename.endswith('.json'):
+            # orjson already returns UTF-8 bytes, so skip the text layer entirely
+            with open(filename, 'wb') as f:
+                f.write(report.to_json_bytes())
+            print(f"[AGENT 3] Report exported to {filename}")
+            return
+
+        with open(filename, 'w', buffering=1 << 20) as f:
+            f.write(f"PRICE COMPARISON REPORT - {report.generated_at}\n\n{report.summary}\n\n")
 
-        with open(filename, 'w') as f:
-            f.write(content)
+            for analysis in report.analyses:
+                f.write(f"{analysis.product.store}: ${analysis.product.price:.2f} - {analysis.deal_quality}\n")
+                f.write(f"{analysis.reasoning}\n\n")
         
         print(f"[AGENT 3] Report exported to {filename}")
 
@@ -279,7 +593,7 @@ def main():
 
     if use_mock:
         # Demo mode with mock data
-        scraped_data = scraper_agent.get_mock_data(product_name)
+        scraped_data, prices = scraper_agent.get_mock_data(product_name, with_prices=True)
     else:
         # Real scraping mode
         print("\nEnter store URLs (one per line, empty line to finish):")
@@ -290,14 +604,14 @@ def main():
                 break
             urls.append(url)
 
-        scraped_data = scraper_agent.scrape_multiple_stores(urls, product_name)
+        scraped_data, prices = scraper_agent.scrape_multiple_stores(urls, product_name, with_prices=True)
 
     if not scraped_data:
         print("\n❌ No data collected. Exiting.")
         return
 
     # Agent 2: Analyze deals
-    analyses = analyzer_agent.analyze_deals(scraped_data)
+    analyses = analyzer_agent.analyze_deals(scraped_data, prices)
 
     # Agent 3: Generate and display report
     report = report_agent.generate_report(analyses)
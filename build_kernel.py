@@ -0,0 +1,12 @@
+"""Build the optional compiled deal kernel next to app.py: python build_kernel.py
+
+Needs Cython and a C compiler; app.py falls back to the NumPy classify_prices without it.
+"""
+from setuptools import setup, Extension
+from Cython.Build import cythonize
+
+setup(
+    name="_deal_kernel",
+    ext_modules=cythonize([Extension("_deal_kernel", ["_deal_kernel.pyx"])]),
+    script_args=["build_ext", "--inplace"],
+)